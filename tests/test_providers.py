@@ -0,0 +1,374 @@
+import io
+import os
+import asyncio
+import threading
+import pytest
+from universal_image_mcp.providers import (AWSProvider, OpenAIProvider, GeminiProvider, _bedrock_client, _openai_client,
+                                           _gemini_client, _LATENCY_REJECTED, _MODELS_CACHE, _GEMINI_CONTEXT_CACHES, GEMINI_CACHE_MIN_CHARS,
+                                           GEMINI_CACHED_PROMPT_FOLLOWUP, get_aws_models)
+
+
+def _reset_caches():
+    for factory in (_bedrock_client, _openai_client, _gemini_client):
+        factory.cache_clear()
+    _MODELS_CACHE.clear()
+    _GEMINI_CONTEXT_CACHES.clear()
+    _LATENCY_REJECTED.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    _reset_caches()
+    yield
+    _reset_caches()
+
+
+class TestBedrockClient:
+    def test_client_shared_across_providers(self, mocker):
+        mocker.patch.dict(os.environ, {"AWS_REGION": "us-west-2"}, clear=True)
+        session = mocker.patch("boto3.Session")
+        first = AWSProvider("amazon.nova-canvas-v1:0").client
+        second = AWSProvider("stability.sd3-5-large-v1:0").client
+        assert first is second
+        session.assert_called_once_with()
+        assert session.return_value.client.call_args[0] == ("bedrock-runtime",)
+        assert session.return_value.client.call_args[1]["region_name"] == "us-west-2"
+
+    def test_client_keyed_by_service(self, mocker):
+        session = mocker.patch("boto3.Session")
+        session.return_value.client.side_effect = lambda service, **kw: service
+        assert _bedrock_client(None, "us-east-1", "bedrock") == "bedrock"
+        assert _bedrock_client(None, "us-east-1", "bedrock-runtime") == "bedrock-runtime"
+        assert session.return_value.client.call_count == 2
+
+    def test_client_config(self, mocker):
+        mocker.patch.dict(os.environ, {"BEDROCK_READ_TIMEOUT": "300"}, clear=True)
+        session = mocker.patch("boto3.Session")
+        AWSProvider("amazon.nova-canvas-v1:0").client
+        config = session.return_value.client.call_args[1]["config"]
+        assert config.read_timeout == 300
+        assert config.connect_timeout == 5
+        assert config.max_pool_connections == 64
+        assert config.retries == {"max_attempts": 5, "mode": "adaptive"}
+
+    def test_read_timeout_parsing(self, mocker):
+        session = mocker.patch("boto3.Session")
+        for value, expected in (("90.5", 90.5), ("abc", 120), ("0", 120)):
+            mocker.patch.dict(os.environ, {"BEDROCK_READ_TIMEOUT": value})
+            AWSProvider("amazon.nova-canvas-v1:0").client
+            assert session.return_value.client.call_args[1]["config"].read_timeout == expected
+
+    def test_missing_credentials_not_cached(self, mocker):
+        from botocore.exceptions import NoCredentialsError
+        mocker.patch.dict(os.environ, {"MODELS_CACHE_TTL": "0"}, clear=True)
+        session = mocker.patch("boto3.Session")
+        session.return_value.client.return_value.list_foundation_models.side_effect = NoCredentialsError()
+        with pytest.raises(ValueError, match="credentials not found"):
+            get_aws_models()
+        session.return_value.client.return_value.list_foundation_models.side_effect = None
+        session.return_value.client.return_value.list_foundation_models.return_value = {"modelSummaries": []}
+        assert get_aws_models() == []
+        assert session.return_value.client.call_count == 2
+
+    def test_profile_used_for_session(self, mocker):
+        session = mocker.patch("boto3.Session")
+        _bedrock_client("dev", "us-east-1", "bedrock")
+        session.assert_called_once_with(profile_name="dev")
+
+
+class TestApiClients:
+    def test_openai_client_shared_per_key(self, mocker):
+        mocker.patch.dict(os.environ, {"OPENAI_API_KEY": "key-a"})
+        first = OpenAIProvider("gpt-image-1.5").client
+        assert OpenAIProvider("gpt-image-1.5").client is first
+        os.environ["OPENAI_API_KEY"] = "key-b"
+        other = OpenAIProvider("gpt-image-1.5").client
+        assert other is not first
+        assert other.api_key == "key-b"
+
+    def test_gemini_client_shared_per_key(self, mocker):
+        factory = mocker.patch("google.genai.Client")
+        mocker.patch.dict(os.environ, {"GEMINI_API_KEY": "key-a"})
+        assert GeminiProvider("models/gemini-2.5-flash-image").client is GeminiProvider("models/imagen-4.0-generate-001").client
+        factory.assert_called_once_with(api_key="key-a")
+
+    def test_missing_key_raises(self, mocker):
+        mocker.patch.dict(os.environ, {}, clear=True)
+        with pytest.raises(ValueError, match="OPENAI_API_KEY not set"):
+            OpenAIProvider("gpt-image-1.5").client
+
+
+class TestAsyncEntryPoints:
+    def test_agenerate_runs_generate_off_loop(self, mocker):
+        provider = AWSProvider("amazon.nova-canvas-v1:0")
+        threads = []
+        mocker.patch.object(provider, "generate", side_effect=lambda *a: threads.append(threading.current_thread()) or b"img")
+        assert asyncio.run(provider.agenerate("a red fox", None, 512, 512)) == b"img"
+        provider.generate.assert_called_once_with("a red fox", None, 512, 512)
+        assert threads[0] is not threading.main_thread()
+
+    def test_atransform_delegates(self, mocker):
+        provider = OpenAIProvider("gpt-image-1.5")
+        mocker.patch.object(provider, "transform", return_value=b"img")
+        assert asyncio.run(provider.atransform(b"\x89PNG", "make it blue")) == b"img"
+        provider.transform.assert_called_once_with(b"\x89PNG", "make it blue")
+
+
+class TestGenerateBatch:
+    def test_results_in_prompt_order(self, mocker):
+        provider = GeminiProvider("models/gemini-2.5-flash-image")
+        mocker.patch.object(provider, "generate", side_effect=lambda prompt, *a: prompt.encode())
+        assert provider.generate_batch(["one", "two", "three"], 512, 512) == [b"one", b"two", b"three"]
+        provider.generate.assert_any_call("two", None, 512, 512)
+
+    def test_first_error_raised_by_default(self, mocker):
+        provider = OpenAIProvider("gpt-image-1.5")
+        mocker.patch.object(provider, "generate", side_effect=ValueError("boom"))
+        with pytest.raises(ValueError, match="boom"):
+            provider.generate_batch(["one", "two"])
+
+    def test_return_exceptions(self, mocker):
+        provider = OpenAIProvider("gpt-image-1.5")
+        error = ValueError("boom")
+
+        def generate(prompt, *args):
+            if prompt == "bad":
+                raise error
+            return b"ok"
+
+        mocker.patch.object(provider, "generate", side_effect=generate)
+        assert provider.generate_batch(["good", "bad"], return_exceptions=True) == [b"ok", error]
+
+    def test_empty_batch(self):
+        assert AWSProvider("amazon.nova-canvas-v1:0").generate_batch([]) == []
+
+
+class TestLatencyOptimized:
+    def _provider(self, mocker, model, latency):
+        mocker.patch.dict(os.environ, {"BEDROCK_LATENCY": latency})
+        provider = AWSProvider(model)
+        provider._client = mocker.Mock()
+        provider._client.invoke_model.return_value = {"body": io.BytesIO(b'{"images": []}')}
+        return provider
+
+    def test_disabled_by_default(self, mocker):
+        mocker.patch.dict(os.environ, {}, clear=True)
+        assert AWSProvider("amazon.nova-canvas-v1:0").latency_optimized is False
+
+    def test_enabled_for_supported_model(self, mocker):
+        provider = self._provider(mocker, "amazon.nova-canvas-v1:0", "optimized")
+        provider._call_model("{}")
+        assert provider.client.invoke_model.call_args[1]["performanceConfigLatency"] == "optimized"
+
+    def test_not_sent_for_unsupported_model(self, mocker):
+        provider = self._provider(mocker, "stability.sd3-5-large-v1:0", "optimized")
+        provider._call_model("{}")
+        assert "performanceConfigLatency" not in provider.client.invoke_model.call_args[1]
+
+    def test_falls_back_to_standard(self, mocker):
+        from botocore.exceptions import ClientError
+        provider = self._provider(mocker, "amazon.nova-canvas-v1:0", "optimized")
+        error = ClientError({"Error": {"Code": "ValidationException", "Message": "unsupported"}}, "InvokeModel")
+        provider.client.invoke_model.side_effect = [error, {"body": io.BytesIO(b'{"images": []}')}]
+        assert provider._call_model("{}") == {"images": []}
+        assert "performanceConfigLatency" not in provider.client.invoke_model.call_args[1]
+        assert provider.latency_optimized is False
+
+    def test_unrelated_validation_error_not_recorded(self, mocker):
+        from botocore.exceptions import ClientError
+        provider = self._provider(mocker, "amazon.nova-canvas-v1:0", "optimized")
+        error = ClientError({"Error": {"Code": "ValidationException", "Message": "width must be a multiple of 16"}}, "InvokeModel")
+        provider.client.invoke_model.side_effect = [error, error]
+        with pytest.raises(ValueError, match="multiple of 16"):
+            provider._call_model("{}")
+        assert not _LATENCY_REJECTED
+        assert AWSProvider("amazon.nova-canvas-v1:0").latency_optimized is True
+
+    def test_rejection_remembered_across_instances(self, mocker):
+        from botocore.exceptions import ClientError
+        provider = self._provider(mocker, "amazon.nova-canvas-v1:0", "optimized")
+        error = ClientError({"Error": {"Code": "ValidationException", "Message": "unsupported"}}, "InvokeModel")
+        provider.client.invoke_model.side_effect = [error, {"body": io.BytesIO(b'{"images": []}')}]
+        provider._call_model("{}")
+        
+        assert AWSProvider("amazon.nova-canvas-v1:0").latency_optimized is False
+        os.environ["AWS_REGION"] = "eu-west-1"
+        assert AWSProvider("amazon.nova-canvas-v1:0").latency_optimized is True
+
+
+class TestModelsCache:
+    SUMMARY = {"modelId": "amazon.nova-canvas-v1:0", "modelName": "Nova Canvas", "providerName": "Amazon",
+               "inputModalities": ["TEXT", "IMAGE"], "modelLifecycle": {"status": "ACTIVE"}}
+
+    def _client(self, mocker):
+        client = mocker.Mock()
+        client.list_foundation_models.return_value = {"modelSummaries": [self.SUMMARY]}
+        return mocker.patch("universal_image_mcp.providers._bedrock_client", return_value=client).return_value
+
+    def test_repeat_calls_hit_cache(self, mocker):
+        mocker.patch.dict(os.environ, {"AWS_REGION": "us-east-1"}, clear=True)
+        client = self._client(mocker)
+        assert get_aws_models() == get_aws_models()
+        client.list_foundation_models.assert_called_once()
+
+    def test_cache_keyed_on_region(self, mocker):
+        mocker.patch.dict(os.environ, {"AWS_REGION": "us-east-1"}, clear=True)
+        client = self._client(mocker)
+        get_aws_models()
+        os.environ["AWS_REGION"] = "us-west-2"
+        get_aws_models()
+        assert client.list_foundation_models.call_count == 2
+
+    def test_zero_ttl_bypasses_cache(self, mocker):
+        mocker.patch.dict(os.environ, {"MODELS_CACHE_TTL": "0"}, clear=True)
+        client = self._client(mocker)
+        get_aws_models()
+        get_aws_models()
+        assert client.list_foundation_models.call_count == 2
+        assert not _MODELS_CACHE
+
+    def test_expired_entry_refetched(self, mocker):
+        mocker.patch.dict(os.environ, {"MODELS_CACHE_TTL": "60"}, clear=True)
+        client = self._client(mocker)
+        clock = mocker.patch("universal_image_mcp.providers.time.monotonic", return_value=1000.0)
+        get_aws_models()
+        clock.return_value = 1061.0
+        get_aws_models()
+        assert client.list_foundation_models.call_count == 2
+
+
+class TestAWSTransform:
+    def test_reference_sent_as_base64_png(self, mocker):
+        import base64
+        import json
+        import PIL.Image
+        provider = AWSProvider("amazon.nova-canvas-v1:0")
+        call_model = mocker.patch.object(provider, "_call_model", return_value={"images": [base64.b64encode(b"out").decode()]})
+        
+        assert provider.transform(PIL.Image.new("RGB", (8, 8), "red"), "make it blue") == b"out"
+        
+        body = json.loads(call_model.call_args[0][0])
+        init_image = base64.b64decode(body["imageVariationParams"]["images"][0])
+        assert init_image.startswith(b"\x89PNG\r\n\x1a\n")
+        assert PIL.Image.open(io.BytesIO(init_image)).getpixel((0, 0)) == (255, 0, 0)
+
+
+class TestGeminiContextCache:
+    LONG_PROMPT = "A detailed style guide. " * (GEMINI_CACHE_MIN_CHARS // 10)
+
+    def _provider(self, mocker, enabled="true"):
+        mocker.patch.dict(os.environ, {"GEMINI_API_KEY": "fake", "GEMINI_CONTEXT_CACHE": enabled})
+        provider = GeminiProvider("models/gemini-2.5-flash")
+        provider._client = mocker.Mock()
+        provider._client.caches.create.return_value.name = "cachedContents/abc"
+        part = mocker.Mock(inline_data=mocker.Mock(data=b"img"))
+        provider._client.models.generate_content.return_value.candidates = [mocker.Mock(content=mocker.Mock(parts=[part]))]
+        return provider
+
+    def test_long_prompt_cached_and_reused(self, mocker):
+        provider = self._provider(mocker)
+        assert provider.generate(self.LONG_PROMPT) == b"img"
+        provider.generate(self.LONG_PROMPT)
+        provider.client.caches.create.assert_called_once()
+        kwargs = provider.client.models.generate_content.call_args[1]
+        assert kwargs["contents"] == [GEMINI_CACHED_PROMPT_FOLLOWUP]
+        assert kwargs["config"].cached_content == "cachedContents/abc"
+
+    def test_short_prompt_not_cached(self, mocker):
+        provider = self._provider(mocker)
+        provider.generate("a red fox")
+        provider.client.caches.create.assert_not_called()
+        assert provider.client.models.generate_content.call_args[1]["contents"] == ["a red fox"]
+
+    def test_disabled_by_default(self, mocker):
+        provider = self._provider(mocker, enabled="false")
+        provider.generate(self.LONG_PROMPT)
+        provider.client.caches.create.assert_not_called()
+
+    def test_cache_failure_remembered_for_model(self, mocker):
+        from google.genai import errors
+        provider = self._provider(mocker)
+        provider.client.caches.create.side_effect = errors.ClientError(400, {"error": {"message": "caching not supported"}})
+        provider.generate(self.LONG_PROMPT)
+        provider.generate(self.LONG_PROMPT + " again")
+        provider.client.caches.create.assert_called_once()
+
+    def test_transient_failure_not_remembered(self, mocker):
+        from google.genai import errors
+        provider = self._provider(mocker)
+        for error in (errors.ClientError(429, {"error": {"message": "rate limited"}}),
+                      errors.ServerError(503, {"error": {"message": "unavailable"}}),
+                      ConnectionError("reset")):
+            provider.client.caches.create.side_effect = error
+            provider.generate(self.LONG_PROMPT)
+        assert provider.client.caches.create.call_count == 3
+        assert not _GEMINI_CONTEXT_CACHES
+
+    def test_expired_entries_dropped(self, mocker):
+        provider = self._provider(mocker)
+        clock = mocker.patch("universal_image_mcp.providers.time.time", return_value=1000.0)
+        provider.generate(self.LONG_PROMPT)
+        clock.return_value = 5000.0
+        provider.generate(self.LONG_PROMPT)
+        assert provider.client.caches.create.call_count == 2
+        assert len(_GEMINI_CONTEXT_CACHES) == 1
+
+    def test_transform_never_uses_context_cache(self, mocker):
+        provider = self._provider(mocker)
+        provider.transform(b"\x89PNG fake", self.LONG_PROMPT)
+        provider.client.caches.create.assert_not_called()
+        assert provider.client.models.generate_content.call_args[1]["contents"][1] == self.LONG_PROMPT
+
+    def test_cache_failure_sends_full_prompt(self, mocker):
+        provider = self._provider(mocker)
+        provider.client.caches.create.side_effect = RuntimeError("caching not supported")
+        provider.generate(self.LONG_PROMPT)
+        kwargs = provider.client.models.generate_content.call_args[1]
+        assert kwargs["contents"] == [self.LONG_PROMPT]
+        assert kwargs["config"].cached_content is None
+
+
+class TestRawReferenceBytes:
+    JPEG = b"\xff\xd8\xff\xe0fake-jpeg"
+
+    def test_aws_sends_bytes_unchanged(self, mocker):
+        import base64
+        import json
+        provider = AWSProvider("amazon.nova-canvas-v1:0")
+        call_model = mocker.patch.object(provider, "_call_model", return_value={"images": [base64.b64encode(b"out").decode()]})
+        provider.transform(self.JPEG, "make it blue")
+        body = json.loads(call_model.call_args[0][0])
+        assert base64.b64decode(body["imageVariationParams"]["images"][0]) == self.JPEG
+
+    def test_openai_uploads_bytes_with_mime(self, mocker):
+        import base64
+        provider = OpenAIProvider("gpt-image-1.5")
+        provider._client = mocker.Mock()
+        provider._client.images.edit.return_value.data = [mocker.Mock(b64_json=base64.b64encode(b"out").decode())]
+        assert provider.transform(self.JPEG, "make it blue") == b"out"
+        assert provider.client.images.edit.call_args[1]["image"] == [("image.jpg", self.JPEG, "image/jpeg")]
+
+    def test_openai_encodes_pil_image_with_fast_png(self, mocker):
+        import base64
+        import PIL.Image
+        provider = OpenAIProvider("gpt-image-1.5")
+        provider._client = mocker.Mock()
+        provider._client.images.edit.return_value.data = [mocker.Mock(b64_json=base64.b64encode(b"out").decode())]
+        image = PIL.Image.new("RGB", (8, 8))
+        save = mocker.spy(image, "save")
+        provider.transform(image, "make it blue")
+        assert save.call_args[1]["compress_level"] == 1
+        name, buffer, mime = provider.client.images.edit.call_args[1]["image"][0]
+        assert (name, mime) == ("image.png", "image/png")
+        assert buffer.read().startswith(b"\x89PNG")
+
+    def test_gemini_wraps_bytes_in_part(self, mocker):
+        mocker.patch.dict(os.environ, {"GEMINI_CONTEXT_CACHE": "false"})
+        provider = GeminiProvider("models/gemini-2.5-flash-image")
+        generate = mocker.patch.object(provider, "_generate_content")
+        generate.return_value.candidates = [mocker.Mock(content=mocker.Mock(parts=[mocker.Mock(inline_data=mocker.Mock(data=b"out"))]))]
+        assert provider.transform(self.JPEG, "make it blue") == b"out"
+        part, prompt = generate.call_args[0][0]
+        assert part.inline_data.data == self.JPEG
+        assert part.inline_data.mime_type == "image/jpeg"
+        assert prompt == "make it blue"
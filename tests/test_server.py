@@ -1,7 +1,9 @@
 import os
+import asyncio
+from io import BytesIO
 import pytest
-from unittest.mock import Mock
-from universal_image_mcp.server import list_models, generate_image, transform_image, get_provider, is_enabled, prompt_guide
+from unittest.mock import Mock, AsyncMock
+from universal_image_mcp.server import list_models, generate_image, generate_images, transform_image, get_provider, is_enabled, prompt_guide, save_image, detect_format, load_reference
 
 FAKE_PNG = b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\n\x00\x00\x00\n\x08\x02\x00\x00\x00\x02PX\xea\x00\x00\x00\x13IDATx\x9cc\xfc\xcf\x80\x0f0\xe1\x95e\x18\xa9\xd2\x00A,\x01\x13y\xed\xba&\x00\x00\x00\x00IEND\xaeB`\x82'
 
@@ -51,9 +53,19 @@ class TestGetProvider:
         provider = get_provider("models/imagen-4.0-generate-001")
         assert provider.model == "models/imagen-4.0-generate-001"
 
+    def test_chatgpt_model(self, mocker):
+        mocker.patch.dict(os.environ, {"ENABLE_OPENAI": "true", "OPENAI_API_KEY": "fake"})
+        provider = get_provider("chatgpt-image-latest")
+        assert type(provider).__name__ == "OpenAIProvider"
+
+    def test_openai_keyword_takes_precedence(self, mocker):
+        mocker.patch.dict(os.environ, {"ENABLE_OPENAI": "true", "ENABLE_GEMINI": "true"})
+        provider = get_provider("models/imagen-gpt-test")
+        assert type(provider).__name__ == "OpenAIProvider"
+
     def test_disabled_provider(self, mocker):
         mocker.patch.dict(os.environ, {"ENABLE_AWS": "false"})
-        with pytest.raises(ValueError, match="not enabled"):
+        with pytest.raises(ValueError, match="AWS provider not enabled. Set ENABLE_AWS=true"):
             get_provider("amazon.nova-canvas-v1:0")
 
     def test_unknown_model(self, mocker):
@@ -65,47 +77,210 @@ class TestGetProvider:
 class TestGenerateImage:
     def test_success_with_sophisticated_prompt(self, mocker, tmp_path):
         mocker.patch.dict(os.environ, {"ENABLE_GEMINI": "true"})
-        mock_provider = Mock()
-        mock_provider.generate.return_value = FAKE_PNG
+        mock_provider = Mock(agenerate=AsyncMock(return_value=FAKE_PNG))
         mocker.patch('universal_image_mcp.server.get_provider', return_value=mock_provider)
         
         output = tmp_path / "test.png"
-        result = generate_image(TEST_PROMPTS["editorial_portrait"], "models/gemini-2.5-flash-image", str(output))
+        result = asyncio.run(generate_image(TEST_PROMPTS["editorial_portrait"], "models/gemini-2.5-flash-image", str(output)))
         
         assert "saved" in result.lower()
         assert output.exists()
-        mock_provider.generate.assert_called_once()
+        mock_provider.agenerate.assert_awaited_once()
         # Verify the full prompt was passed
-        call_args = mock_provider.generate.call_args
+        call_args = mock_provider.agenerate.call_args
         assert "Icelandic fisherman" in call_args[0][0]
 
     def test_with_custom_dimensions(self, mocker, tmp_path):
         mocker.patch.dict(os.environ, {"ENABLE_AWS": "true"})
-        mock_provider = Mock()
-        mock_provider.generate.return_value = FAKE_PNG
+        mock_provider = Mock(agenerate=AsyncMock(return_value=FAKE_PNG))
         mocker.patch('universal_image_mcp.server.get_provider', return_value=mock_provider)
         
         output = tmp_path / "wide.png"
-        result = generate_image(TEST_PROMPTS["architectural"], "amazon.nova-canvas-v1:0", str(output), width=1280, height=720)
+        result = asyncio.run(generate_image(TEST_PROMPTS["architectural"], "amazon.nova-canvas-v1:0", str(output), width=1280, height=720))
         
         assert "saved" in result.lower()
-        mock_provider.generate.assert_called_with(TEST_PROMPTS["architectural"], None, 1280, 720)
+        mock_provider.agenerate.assert_awaited_with(TEST_PROMPTS["architectural"], None, 1280, 720)
+
+    def test_png_reference_passed_as_bytes(self, mocker, tmp_path):
+        mocker.patch.dict(os.environ, {"ENABLE_AWS": "true"})
+        mock_provider = Mock(agenerate=AsyncMock(return_value=FAKE_PNG))
+        mocker.patch('universal_image_mcp.server.get_provider', return_value=mock_provider)
+        reference = tmp_path / "ref.png"
+        reference.write_bytes(FAKE_PNG)
+        
+        result = asyncio.run(generate_image(TEST_PROMPTS["concept_art"], "amazon.nova-canvas-v1:0", str(tmp_path / "out.png"), reference_image=str(reference)))
+        
+        assert "saved" in result.lower()
+        assert mock_provider.agenerate.call_args[0][1] == FAKE_PNG
 
     def test_missing_image_path(self, mocker, tmp_path):
         mocker.patch.dict(os.environ, {"ENABLE_OPENAI": "true"})
-        mock_provider = Mock()
-        mock_provider.generate.return_value = FAKE_PNG
+        mock_provider = Mock(agenerate=AsyncMock(return_value=FAKE_PNG))
         mocker.patch('universal_image_mcp.server.get_provider', return_value=mock_provider)
         
-        result = generate_image(TEST_PROMPTS["product"], "gpt-image-1.5", str(tmp_path / "output.png"), reference_image="/nonexistent/image.png")
+        result = asyncio.run(generate_image(TEST_PROMPTS["product"], "gpt-image-1.5", str(tmp_path / "output.png"), reference_image="/nonexistent/image.png"))
         assert "not found" in result.lower()
 
 
+class TestImageCache:
+    def _provider(self, mocker):
+        mock_provider = Mock(agenerate=AsyncMock(return_value=FAKE_PNG))
+        mocker.patch('universal_image_mcp.server.get_provider', return_value=mock_provider)
+        return mock_provider
+
+    def test_repeat_request_served_from_cache(self, mocker, tmp_path):
+        mocker.patch.dict(os.environ, {"IMAGE_CACHE": "true", "IMAGE_CACHE_DIR": str(tmp_path / "cache")})
+        mock_provider = self._provider(mocker)
+        first, second = tmp_path / "first.png", tmp_path / "second.png"
+        
+        asyncio.run(generate_image(TEST_PROMPTS["product"], "gpt-image-1.5", str(first)))
+        result = asyncio.run(generate_image(TEST_PROMPTS["product"], "gpt-image-1.5", str(second)))
+        
+        assert "cached" in result
+        assert second.read_bytes() == FAKE_PNG
+        mock_provider.agenerate.assert_awaited_once()
+
+    def test_different_arguments_miss(self, mocker, tmp_path):
+        mocker.patch.dict(os.environ, {"IMAGE_CACHE": "true", "IMAGE_CACHE_DIR": str(tmp_path / "cache")})
+        mock_provider = self._provider(mocker)
+        
+        asyncio.run(generate_image(TEST_PROMPTS["product"], "gpt-image-1.5", str(tmp_path / "a.png")))
+        asyncio.run(generate_image(TEST_PROMPTS["product"], "gpt-image-1.5", str(tmp_path / "b.png"), width=512, height=512))
+        
+        assert mock_provider.agenerate.await_count == 2
+
+    def test_disabled_by_default(self, mocker, tmp_path):
+        mocker.patch.dict(os.environ, {"IMAGE_CACHE_DIR": str(tmp_path / "cache")})
+        os.environ.pop("IMAGE_CACHE", None)
+        mock_provider = self._provider(mocker)
+        
+        asyncio.run(generate_image(TEST_PROMPTS["product"], "gpt-image-1.5", str(tmp_path / "a.png")))
+        asyncio.run(generate_image(TEST_PROMPTS["product"], "gpt-image-1.5", str(tmp_path / "b.png")))
+        
+        assert mock_provider.agenerate.await_count == 2
+        assert not (tmp_path / "cache").exists()
+
+    def test_cache_key_computed_off_loop(self, mocker, tmp_path):
+        import threading
+        from universal_image_mcp import image_cache
+        mocker.patch.dict(os.environ, {"IMAGE_CACHE": "true", "IMAGE_CACHE_DIR": str(tmp_path / "cache")})
+        self._provider(mocker)
+        threads = []
+        real_key = image_cache.cache_key
+        mocker.patch.object(image_cache, "cache_key", side_effect=lambda *a: threads.append(threading.current_thread()) or real_key(*a))
+        
+        asyncio.run(generate_image(TEST_PROMPTS["product"], "gpt-image-1.5", str(tmp_path / "a.png")))
+        
+        assert threads and threads[0] is not threading.main_thread()
+
+    def test_corrupt_entry_regenerated(self, mocker, tmp_path):
+        cache = tmp_path / "cache"
+        mocker.patch.dict(os.environ, {"IMAGE_CACHE": "true", "IMAGE_CACHE_DIR": str(cache)})
+        mock_provider = self._provider(mocker)
+        asyncio.run(generate_image(TEST_PROMPTS["product"], "gpt-image-1.5", str(tmp_path / "a.png")))
+        entry, = cache.iterdir()
+        entry.write_bytes(FAKE_PNG[:40] + b"\x00" * 10 + FAKE_PNG[50:])
+        
+        result = asyncio.run(generate_image(TEST_PROMPTS["product"], "gpt-image-1.5", str(tmp_path / "b.png")))
+        
+        assert result == f"Image saved to {tmp_path / 'b.png'}"
+        assert (tmp_path / "b.png").read_bytes() == FAKE_PNG
+        assert entry.read_bytes() == FAKE_PNG
+        assert mock_provider.agenerate.await_count == 2
+
+    def test_output_error_keeps_valid_entry(self, mocker, tmp_path):
+        cache = tmp_path / "cache"
+        mocker.patch.dict(os.environ, {"IMAGE_CACHE": "true", "IMAGE_CACHE_DIR": str(cache)})
+        mock_provider = self._provider(mocker)
+        asyncio.run(generate_image(TEST_PROMPTS["product"], "gpt-image-1.5", str(tmp_path / "a.png")))
+        mocker.patch('universal_image_mcp.server.save_image', side_effect=OSError("cannot write mode RGBA as JPEG"))
+        
+        result = asyncio.run(generate_image(TEST_PROMPTS["product"], "gpt-image-1.5", str(tmp_path / "a.jpg")))
+        
+        assert result == "Error: cannot write mode RGBA as JPEG"
+        mock_provider.agenerate.assert_awaited_once()
+        assert len(list(cache.iterdir())) == 1
+
+    def test_invalid_max_size_fails_before_generating(self, mocker, tmp_path):
+        mocker.patch.dict(os.environ, {"IMAGE_CACHE": "true", "IMAGE_CACHE_DIR": str(tmp_path / "cache"), "IMAGE_CACHE_MAX_MB": "1GB"})
+        mock_provider = self._provider(mocker)
+        
+        result = asyncio.run(generate_image(TEST_PROMPTS["product"], "gpt-image-1.5", str(tmp_path / "a.png")))
+        
+        assert "IMAGE_CACHE_MAX_MB must be a number" in result
+        mock_provider.agenerate.assert_not_awaited()
+
+    def test_unreadable_entry_is_a_miss(self, mocker, tmp_path):
+        from universal_image_mcp import image_cache
+        (tmp_path / "key.bin").write_bytes(FAKE_PNG)
+        mocker.patch("universal_image_mcp.image_cache.os.utime", side_effect=PermissionError("denied"))
+        assert image_cache.load(str(tmp_path), "key") is None
+        assert not (tmp_path / "key.bin").exists()
+
+    def test_concurrent_stores_use_distinct_temp_files(self, mocker, tmp_path):
+        from universal_image_mcp import image_cache
+        replaced = []
+        real_replace = os.replace
+        mocker.patch("universal_image_mcp.image_cache.os.replace", side_effect=lambda src, dst: replaced.append(src) or real_replace(src, dst))
+        image_cache.store(str(tmp_path), "key", FAKE_PNG, 1024 * 1024)
+        image_cache.store(str(tmp_path), "key", FAKE_PNG, 1024 * 1024)
+        assert replaced[0] != replaced[1]
+        assert [p.name for p in tmp_path.iterdir()] == ["key.bin"]
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        from universal_image_mcp import image_cache
+        for i, name in enumerate(["old", "mid", "new"]):
+            path = tmp_path / f"{name}.bin"
+            path.write_bytes(b"x" * 100)
+            os.utime(path, (1000 + i, 1000 + i))
+        
+        image_cache.evict(str(tmp_path), 250)
+        
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["mid.bin", "new.bin"]
+
+
+class TestGenerateImages:
+    def test_saves_each_image(self, mocker, tmp_path):
+        mocker.patch.dict(os.environ, {"ENABLE_GEMINI": "true"})
+        mock_provider = Mock()
+        mock_provider.generate_batch.return_value = [FAKE_PNG, FAKE_PNG]
+        mocker.patch('universal_image_mcp.server.get_provider', return_value=mock_provider)
+        outputs = [tmp_path / "portrait.png", tmp_path / "street.png"]
+        prompts = [TEST_PROMPTS["editorial_portrait"], TEST_PROMPTS["street"]]
+        
+        result = asyncio.run(generate_images(prompts, "models/gemini-2.5-flash-image", [str(p) for p in outputs]))
+        
+        assert result.count("Image saved to") == 2
+        assert all(p.read_bytes() == FAKE_PNG for p in outputs)
+        mock_provider.generate_batch.assert_called_once_with(prompts, 1024, 1024, return_exceptions=True)
+
+    def test_failed_prompt_reported_per_image(self, mocker, tmp_path):
+        mocker.patch.dict(os.environ, {"ENABLE_OPENAI": "true"})
+        mock_provider = Mock()
+        mock_provider.generate_batch.return_value = [FAKE_PNG, ValueError("OpenAI API error: content policy")]
+        mocker.patch('universal_image_mcp.server.get_provider', return_value=mock_provider)
+        outputs = [str(tmp_path / "a.png"), str(tmp_path / "b.png")]
+        
+        result = asyncio.run(generate_images(["a", "b"], "gpt-image-1.5", outputs))
+        
+        assert f"Image saved to {outputs[0]}" in result
+        assert f"Error ({outputs[1]}): OpenAI API error: content policy" in result
+
+    def test_empty_prompts(self, mocker):
+        get_provider = mocker.patch('universal_image_mcp.server.get_provider')
+        result = asyncio.run(generate_images([], "gpt-image-1.5", []))
+        assert result == "Error: prompts must not be empty"
+        get_provider.assert_not_called()
+
+    def test_mismatched_lengths(self, tmp_path):
+        result = asyncio.run(generate_images(["a", "b"], "gpt-image-1.5", [str(tmp_path / "a.png")]))
+        assert "same length" in result
+
+
 class TestTransformImage:
     def test_success(self, mocker, tmp_path):
         mocker.patch.dict(os.environ, {"ENABLE_AWS": "true"})
-        mock_provider = Mock()
-        mock_provider.transform.return_value = FAKE_PNG
+        mock_provider = Mock(atransform=AsyncMock(return_value=FAKE_PNG))
         mocker.patch('universal_image_mcp.server.get_provider', return_value=mock_provider)
         
         # Create a source image
@@ -113,17 +288,118 @@ class TestTransformImage:
         source.write_bytes(FAKE_PNG)
         output = tmp_path / "transformed.png"
         
-        result = transform_image(str(source), "Convert to watercolor painting style with soft edges", "amazon.nova-canvas-v1:0", str(output))
+        result = asyncio.run(transform_image(str(source), "Convert to watercolor painting style with soft edges", "amazon.nova-canvas-v1:0", str(output)))
         
         assert "saved" in result.lower()
         assert output.exists()
 
     def test_source_not_found(self, mocker, tmp_path):
         mocker.patch.dict(os.environ, {"ENABLE_GEMINI": "true"})
-        result = transform_image("/nonexistent/source.png", "Make it black and white", "models/gemini-2.5-flash-image", str(tmp_path / "out.png"))
+        result = asyncio.run(transform_image("/nonexistent/source.png", "Make it black and white", "models/gemini-2.5-flash-image", str(tmp_path / "out.png")))
         assert "not found" in result.lower()
 
 
+class TestLoadReference:
+    def test_png_returned_as_bytes(self, tmp_path):
+        path = tmp_path / "ref.png"
+        path.write_bytes(FAKE_PNG)
+        assert load_reference(str(path)) == FAKE_PNG
+
+    def test_other_formats_decoded(self, tmp_path):
+        import PIL.Image
+        path = tmp_path / "ref.bmp"
+        PIL.Image.new("RGB", (4, 4)).save(path)
+        image = load_reference(str(path))
+        assert isinstance(image, PIL.Image.Image)
+        assert image.size == (4, 4)
+
+    def test_palette_and_cmyk_converted(self, tmp_path):
+        import PIL.Image
+        gif = tmp_path / "ref.gif"
+        PIL.Image.new("P", (4, 4)).save(gif)
+        tiff = tmp_path / "ref.tiff"
+        PIL.Image.new("CMYK", (4, 4)).save(tiff)
+        assert load_reference(str(gif)).mode in ("RGB", "RGBA")
+        assert load_reference(str(tiff)).mode == "RGB"
+
+    def test_alpha_kept_only_when_present(self, tmp_path):
+        import PIL.Image
+        lab = tmp_path / "ref.tiff"
+        PIL.Image.new("LAB", (4, 4)).save(lab)
+        la = tmp_path / "ref_la.tiff"
+        PIL.Image.new("LA", (4, 4)).save(la)
+        assert load_reference(str(lab)).mode == "RGB"
+        assert load_reference(str(la)).mode == "RGBA"
+
+
+class TestSaveImage:
+    def test_detect_format(self):
+        assert detect_format(FAKE_PNG) == "PNG"
+        assert detect_format(b'\xff\xd8\xff\xe0') == "JPEG"
+        assert detect_format(b'RIFF\x00\x00\x00\x00WEBPVP8 ') == "WEBP"
+        assert detect_format(b'not an image') is None
+
+    def test_matching_format_written_verbatim(self, mocker, tmp_path):
+        import PIL.Image
+        save = mocker.spy(PIL.Image.Image, "save")
+        load = mocker.spy(PIL.ImageFile.ImageFile, "load")
+        output = tmp_path / "nested" / "out.png"
+        save_image(FAKE_PNG, str(output))
+        assert output.read_bytes() == FAKE_PNG
+        save.assert_not_called()
+        load.assert_not_called()
+
+    def test_truncated_jpeg_and_webp_not_written(self, tmp_path):
+        import PIL.Image
+        for ext, fmt in (("jpg", "JPEG"), ("webp", "WEBP")):
+            buffer = BytesIO()
+            PIL.Image.new("RGB", (16, 16), "red").save(buffer, format=fmt)
+            data = buffer.getvalue()
+            output = tmp_path / f"out.{ext}"
+            with pytest.raises(ValueError, match="Truncated"):
+                save_image(data[:len(data) // 2], str(output))
+            assert not output.exists()
+            save_image(data, str(output))
+            assert output.read_bytes() == data
+
+    def test_jpeg_with_trailing_padding_written(self, tmp_path):
+        import PIL.Image
+        buffer = BytesIO()
+        PIL.Image.new("RGB", (16, 16), "red").save(buffer, format="JPEG")
+        data = buffer.getvalue() + b"\x00\x00"
+        output = tmp_path / "out.jpg"
+        save_image(data, str(output))
+        assert output.read_bytes() == data
+
+    def test_corrupt_image_not_written(self, tmp_path):
+        output = tmp_path / "out.png"
+        corrupt = FAKE_PNG[:40] + b"\x00" * 10 + FAKE_PNG[50:]
+        with pytest.raises(Exception):
+            save_image(corrupt, str(output))
+        assert not output.exists()
+
+    def test_converts_when_extension_differs(self, tmp_path):
+        output = tmp_path / "out.jpg"
+        save_image(FAKE_PNG, str(output))
+        assert detect_format(output.read_bytes()) == "JPEG"
+
+    def test_fast_save_options(self, mocker, tmp_path):
+        import PIL.Image
+        mocker.patch.dict(os.environ, {"FAST_IMAGE_SAVE": "true"})
+        save = mocker.spy(PIL.Image.Image, "save")
+        output = tmp_path / "out.webp"
+        save_image(FAKE_PNG, str(output))
+        assert save.call_args[1] == {"quality": 90, "method": 0}
+        assert detect_format(output.read_bytes()) == "WEBP"
+
+    def test_default_save_options(self, mocker, tmp_path):
+        import PIL.Image
+        mocker.patch.dict(os.environ, {}, clear=True)
+        save = mocker.spy(PIL.Image.Image, "save")
+        save_image(FAKE_PNG, str(tmp_path / "out.jpg"))
+        assert save.call_args[1] == {}
+
+
 class TestPromptGuide:
     def test_returns_content(self):
         guide = prompt_guide()
@@ -149,9 +425,54 @@ class TestPromptGuide:
 class TestListModels:
     def test_no_providers_enabled(self, mocker):
         mocker.patch.dict(os.environ, {"ENABLE_AWS": "false", "ENABLE_OPENAI": "false", "ENABLE_GEMINI": "false"}, clear=True)
-        result = list_models()
+        result = asyncio.run(list_models())
         assert "No providers enabled" in result
 
+    def test_enabled_providers_listed_in_order(self, mocker):
+        mocker.patch.dict(os.environ, {"ENABLE_AWS": "true", "ENABLE_OPENAI": "false", "ENABLE_GEMINI": "true"}, clear=True)
+        mocker.patch('universal_image_mcp.providers.get_aws_models', return_value=[
+            {"id": "amazon.nova-canvas-v1:0", "name": "Nova Canvas", "provider": "Amazon", "input": ["TEXT", "IMAGE"], "status": "ACTIVE"}])
+        mocker.patch('universal_image_mcp.providers.get_gemini_models', return_value=[
+            {"id": "models/gemini-2.5-flash-image", "name": "Nano Banana", "description": None}])
+        openai_models = mocker.patch('universal_image_mcp.providers.get_openai_models')
+        
+        result = asyncio.run(list_models())
+        
+        assert result.index("AWS Bedrock:") < result.index("Google Gemini:")
+        assert "amazon.nova-canvas-v1:0" in result
+        assert "models/gemini-2.5-flash-image" in result
+        assert "OpenAI:" not in result
+        openai_models.assert_not_called()
+
+    def test_output_format(self, mocker):
+        mocker.patch.dict(os.environ, {"ENABLE_AWS": "true", "ENABLE_GEMINI": "true"}, clear=True)
+        mocker.patch('universal_image_mcp.providers.get_aws_models', return_value=[
+            {"id": "amazon.nova-canvas-v1:0", "name": "Nova Canvas", "provider": "Amazon", "input": ["TEXT", "IMAGE"], "status": "ACTIVE"}])
+        mocker.patch('universal_image_mcp.providers.get_gemini_models', return_value=[
+            {"id": "models/gemini-2.5-flash-image", "name": "Nano Banana", "description": "Image generation and editing"}])
+        
+        assert asyncio.run(list_models()) == (
+            "AWS Bedrock:\n"
+            "  amazon.nova-canvas-v1:0\n"
+            "    Name: Nova Canvas | Provider: Amazon | Status: ACTIVE\n"
+            "    Input: TEXT, IMAGE\n"
+            "Google Gemini:\n"
+            "  models/gemini-2.5-flash-image\n"
+            "    Name: Nano Banana\n"
+            "    Image generation and editing..."
+        )
+
+    def test_provider_error_does_not_hide_others(self, mocker):
+        mocker.patch.dict(os.environ, {"ENABLE_AWS": "true", "ENABLE_GEMINI": "true"}, clear=True)
+        mocker.patch('universal_image_mcp.providers.get_aws_models', side_effect=ValueError("AWS credentials not found."))
+        mocker.patch('universal_image_mcp.providers.get_gemini_models', return_value=[
+            {"id": "models/gemini-2.5-flash-image", "name": "Nano Banana", "description": None}])
+        
+        result = asyncio.run(list_models())
+        
+        assert "AWS Bedrock:\n  Error: AWS credentials not found." in result
+        assert "models/gemini-2.5-flash-image" in result
+
 
 # Integration tests - require real credentials
 @pytest.mark.integration
@@ -165,7 +486,7 @@ class TestIntegrationAWS:
     def test_generate_editorial_portrait(self, tmp_path):
         os.environ["ENABLE_AWS"] = "true"
         output = tmp_path / "editorial_portrait.png"
-        result = generate_image(TEST_PROMPTS["editorial_portrait"], "amazon.nova-canvas-v1:0", str(output))
+        result = asyncio.run(generate_image(TEST_PROMPTS["editorial_portrait"], "amazon.nova-canvas-v1:0", str(output)))
         assert "saved" in result.lower()
         assert output.exists()
         assert output.stat().st_size > 1000  # Real image should be > 1KB
@@ -173,7 +494,7 @@ class TestIntegrationAWS:
     def test_generate_concept_art(self, tmp_path):
         os.environ["ENABLE_AWS"] = "true"
         output = tmp_path / "concept_art.png"
-        result = generate_image(TEST_PROMPTS["concept_art"], "amazon.nova-canvas-v1:0", str(output))
+        result = asyncio.run(generate_image(TEST_PROMPTS["concept_art"], "amazon.nova-canvas-v1:0", str(output)))
         assert "saved" in result.lower()
         assert output.exists()
 
@@ -189,7 +510,7 @@ class TestIntegrationOpenAI:
     def test_generate_product_shot(self, tmp_path):
         os.environ["ENABLE_OPENAI"] = "true"
         output = tmp_path / "product.png"
-        result = generate_image(TEST_PROMPTS["product"], "gpt-image-1.5", str(output))
+        result = asyncio.run(generate_image(TEST_PROMPTS["product"], "gpt-image-1.5", str(output)))
         assert "saved" in result.lower()
         assert output.exists()
 
@@ -204,13 +525,13 @@ class TestIntegrationGemini:
     def test_generate_surreal(self, tmp_path):
         os.environ["ENABLE_GEMINI"] = "true"
         output = tmp_path / "surreal.png"
-        result = generate_image(TEST_PROMPTS["surreal"], "models/gemini-2.5-flash-image", str(output))
+        result = asyncio.run(generate_image(TEST_PROMPTS["surreal"], "models/gemini-2.5-flash-image", str(output)))
         assert "saved" in result.lower()
         assert output.exists()
 
     def test_generate_street_photography(self, tmp_path):
         os.environ["ENABLE_GEMINI"] = "true"
         output = tmp_path / "street.png"
-        result = generate_image(TEST_PROMPTS["street"], "models/gemini-2.5-flash-image", str(output))
+        result = asyncio.run(generate_image(TEST_PROMPTS["street"], "models/gemini-2.5-flash-image", str(output)))
         assert "saved" in result.lower()
         assert output.exists()
@@ -0,0 +1,91 @@
+"""On-disk cache of generated images keyed by request arguments (IMAGE_CACHE=true)"""
+import os
+import hashlib
+import tempfile
+from typing import Optional
+
+DEFAULT_CACHE_DIR = os.path.join("~", ".cache", "universal-image-mcp")
+DEFAULT_CACHE_MAX_MB = 500
+
+def cache_dir() -> Optional[str]:
+    """Cache directory, or None when IMAGE_CACHE is not enabled."""
+    if os.getenv("IMAGE_CACHE", "false").lower() != "true":
+        return None
+    return os.path.expanduser(os.getenv("IMAGE_CACHE_DIR", DEFAULT_CACHE_DIR))
+
+def max_bytes() -> int:
+    """IMAGE_CACHE_MAX_MB in bytes; read before generating so a bad value fails fast."""
+    value = os.getenv("IMAGE_CACHE_MAX_MB", str(DEFAULT_CACHE_MAX_MB))
+    try:
+        return int(float(value) * 1024 * 1024)
+    except ValueError:
+        raise ValueError(f"IMAGE_CACHE_MAX_MB must be a number of megabytes, got {value!r}")
+
+def cache_key(model_id: str, prompt: str, width: int, height: int, reference=None) -> str:
+    """SHA256 of the request; reference is the raw PNG/JPEG bytes or a decoded PIL image."""
+    from .providers import json_dumps
+    ref_hash = None
+    if isinstance(reference, bytes):
+        ref_hash = hashlib.sha256(reference).hexdigest()
+    elif reference is not None:
+        ref_hash = f"{reference.mode}:{reference.size}:{hashlib.sha256(reference.tobytes()).hexdigest()}"
+    payload = json_dumps([model_id, prompt, width, height, ref_hash])
+    if isinstance(payload, str):
+        payload = payload.encode()
+    return hashlib.sha256(payload).hexdigest()
+
+def load(directory: str, key: str) -> Optional[bytes]:
+    """Cached image bytes, or None on a miss; unreadable entries are discarded."""
+    path = os.path.join(directory, f"{key}.bin")
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)  # Bump mtime so eviction treats it as recently used
+    except FileNotFoundError:
+        return None
+    except OSError:
+        discard(directory, key)
+        return None
+    return data
+
+def discard(directory: str, key: str) -> None:
+    try:
+        os.remove(os.path.join(directory, f"{key}.bin"))
+    except OSError:
+        pass
+
+def store(directory: str, key: str, image_data: bytes, limit: int) -> None:
+    os.makedirs(directory, exist_ok=True)
+    # Unique temp file per write - concurrent identical requests run in threads of one process
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(image_data)
+        os.replace(tmp_path, os.path.join(directory, f"{key}.bin"))
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    evict(directory, limit)
+
+def evict(directory: str, max_bytes: int) -> None:
+    """Delete least recently used entries until the cache fits in max_bytes."""
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(".bin"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # Removed by a concurrent writer's eviction
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
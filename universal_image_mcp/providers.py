@@ -1,10 +1,23 @@
 """Image generation providers - lazy initialization"""
 import os
-import json
-import base64
+import asyncio
+import re
+import binascii
+import functools
+import hashlib
+import time
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union
 import PIL.Image
 
+try:
+    import orjson
+    json_dumps, json_loads = orjson.dumps, orjson.loads
+except ImportError:
+    import json
+    json_dumps, json_loads = json.dumps, json.loads
+
 # Models to exclude from listing (older/experimental/specialized versions)
 EXCLUDED_MODELS = {
     "gemini": [
@@ -36,16 +49,108 @@ EXCLUDED_MODELS = {
     ],
 }
 
+# OpenAI model ids that produce images (gpt-image-*, chatgpt-image-*, dall-e-*)
+OPENAI_IMAGE_PATTERN = re.compile(r'image|dall', re.I)
+
+# Bedrock models that may accept latency-optimized inference (BEDROCK_LATENCY=optimized)
+LATENCY_OPTIMIZED_PREFIXES = ("amazon.nova-",)
+# (model, region) pairs that rejected optimized latency - remembered for the life of the process
+_LATENCY_REJECTED = set()
+
+# Gemini explicit context caching (GEMINI_CONTEXT_CACHE=true) - prompts shorter than ~2048 tokens are rejected
+GEMINI_CACHE_MIN_CHARS = 8192
+GEMINI_CACHE_TTL = 600
+GEMINI_CACHED_PROMPT_FOLLOWUP = "Generate the image described above."
+GEMINI_CACHE_REJECTED = object()
+_GEMINI_CONTEXT_CACHES = {}
+
+def _cache_lookup(key: str):
+    """Unexpired value from _GEMINI_CONTEXT_CACHES, dropping the entry once it has expired."""
+    entry = _GEMINI_CONTEXT_CACHES.get(key)
+    if entry is None:
+        return None
+    if entry[1] <= time.time():
+        _GEMINI_CONTEXT_CACHES.pop(key, None)
+        return None
+    return entry[0]
+
+def _mime_type(data: bytes) -> str:
+    """MIME type of already-encoded reference bytes (callers only pass PNG or JPEG)."""
+    return "image/jpeg" if data.startswith(b"\xff\xd8") else "image/png"
+
+# Image generations can outlast botocore's default 60s read timeout
+DEFAULT_BEDROCK_READ_TIMEOUT = 120
+
+# --- Shared clients ---
+
+@functools.lru_cache(maxsize=8)
+def _bedrock_client(profile: str, region: str, service: str, read_timeout: float = DEFAULT_BEDROCK_READ_TIMEOUT):
+    """Build a boto3 client once per (profile, region, service) and share it across calls."""
+    import boto3
+    from botocore.config import Config
+    session = boto3.Session(profile_name=profile) if profile else boto3.Session()
+    config = Config(
+        retries={"max_attempts": 5, "mode": "adaptive"},
+        tcp_keepalive=True,
+        max_pool_connections=64,
+        connect_timeout=5,
+        read_timeout=read_timeout,
+    )
+    return session.client(service, region_name=region, config=config)
+
+def _read_timeout() -> float:
+    """BEDROCK_READ_TIMEOUT in seconds, falling back to the default for unparseable or non-positive values."""
+    try:
+        timeout = float(os.getenv("BEDROCK_READ_TIMEOUT", DEFAULT_BEDROCK_READ_TIMEOUT))
+    except ValueError:
+        return DEFAULT_BEDROCK_READ_TIMEOUT
+    return timeout if timeout > 0 else DEFAULT_BEDROCK_READ_TIMEOUT
+
+def _aws_client(service: str):
+    return _bedrock_client(os.getenv("AWS_PROFILE"), os.getenv("AWS_REGION", "us-east-1"), service, _read_timeout())
+
+@functools.lru_cache(maxsize=4)
+def _openai_client(api_key: str):
+    """Build one OpenAI client per API key so its connection pool is reused across calls."""
+    import httpx
+    from openai import OpenAI
+    # Image generation can run for minutes; only the connect phase gets a tight timeout
+    return OpenAI(api_key=api_key, max_retries=2, timeout=httpx.Timeout(300.0, connect=5.0))
+
+@functools.lru_cache(maxsize=4)
+def _gemini_client(api_key: str):
+    """Build one Gemini client per API key so its connection pool is reused across calls."""
+    from google import genai
+    return genai.Client(api_key=api_key)
+
 # --- Model listing (lazy imports) ---
 
+DEFAULT_MODELS_CACHE_TTL = 3600
+_MODELS_CACHE = {}
+
+def _ttl_cache(*env_keys: str):
+    """Cache a model lister for MODELS_CACHE_TTL seconds, keyed on the env vars that select the account."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper():
+            ttl = float(os.getenv("MODELS_CACHE_TTL", DEFAULT_MODELS_CACHE_TTL))
+            if ttl <= 0:
+                return fn()
+            key = (fn.__name__, *(os.getenv(k) for k in env_keys))
+            cached = _MODELS_CACHE.get(key)
+            if cached and time.monotonic() - cached[0] < ttl:
+                return cached[1]
+            value = fn()
+            _MODELS_CACHE[key] = (time.monotonic(), value)
+            return value
+        return wrapper
+    return decorator
+
+@_ttl_cache("AWS_PROFILE", "AWS_REGION")
 def get_aws_models():
-    import boto3
     from botocore.exceptions import TokenRetrievalError, NoCredentialsError, ClientError
     try:
-        region = os.getenv("AWS_REGION", "us-east-1")
-        profile = os.getenv("AWS_PROFILE")
-        session = boto3.Session(profile_name=profile) if profile else boto3.Session()
-        client = session.client("bedrock", region_name=region)
+        client = _aws_client("bedrock")
         response = client.list_foundation_models(byOutputModality="IMAGE")
         
         excluded = EXCLUDED_MODELS.get("aws", [])
@@ -55,23 +160,24 @@ def get_aws_models():
     except TokenRetrievalError:
         raise ValueError("AWS SSO session expired. Run 'aws sso login' to refresh.")
     except NoCredentialsError:
+        _bedrock_client.cache_clear()  # Client was built without credentials - rebuild once they're configured
         raise ValueError("AWS credentials not found. Configure AWS_PROFILE or credentials.")
     except ClientError as e:
         raise ValueError(f"AWS API error: {e.response['Error']['Message']}")
 
+@_ttl_cache("OPENAI_API_KEY")
 def get_openai_models():
-    from openai import OpenAI
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    client = _openai_client(os.getenv("OPENAI_API_KEY"))
     response = client.models.list()
     
     excluded = EXCLUDED_MODELS.get("openai", [])
     return [{"id": m.id, "created": m.created, "owned_by": m.owned_by} 
             for m in response.data 
-            if any(x in m.id.lower() for x in ["image", "dall", "gpt-image"]) and m.id not in excluded]
+            if OPENAI_IMAGE_PATTERN.search(m.id) and m.id not in excluded]
 
+@_ttl_cache("GEMINI_API_KEY")
 def get_gemini_models():
-    from google import genai
-    client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+    client = _gemini_client(os.getenv("GEMINI_API_KEY"))
     response = client.models.list()
     
     excluded = EXCLUDED_MODELS.get("gemini", [])
@@ -80,74 +186,125 @@ def get_gemini_models():
 
 # --- Providers (lazy client creation) ---
 
-class AWSProvider:
+class ImageProvider:
+    """Async entry points shared by all providers - the blocking SDK call runs in a worker thread."""
+    
+    async def agenerate(self, prompt: str, reference: Union[PIL.Image.Image, bytes] = None, width: int = 1024, height: int = 1024) -> bytes:
+        return await asyncio.to_thread(self.generate, prompt, reference, width, height)
+    
+    async def atransform(self, image: Union[PIL.Image.Image, bytes], prompt: str) -> bytes:
+        return await asyncio.to_thread(self.transform, image, prompt)
+    
+    def generate_batch(self, prompts: list[str], width: int = 1024, height: int = 1024, return_exceptions: bool = False) -> list:
+        """Generate one image per prompt in parallel, returning results in prompt order.
+        
+        With return_exceptions=True a failed prompt yields its exception instead of aborting the batch.
+        """
+        if not prompts:
+            return []
+        
+        def run(prompt):
+            try:
+                return self.generate(prompt, None, width, height)
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                return e
+        
+        with ThreadPoolExecutor(max_workers=min(len(prompts), 8)) as executor:
+            return list(executor.map(run, prompts))
+
+
+class AWSProvider(ImageProvider):
     def __init__(self, model: str):
         self.model = model
         self._client = None
+        self.region = os.getenv("AWS_REGION", "us-east-1")
+        self.latency_optimized = (os.getenv("BEDROCK_LATENCY", "standard").lower() == "optimized"
+                                  and model.startswith(LATENCY_OPTIMIZED_PREFIXES)
+                                  and (model, self.region) not in _LATENCY_REJECTED)
     
     @property
     def client(self):
         if self._client is None:
-            import boto3
-            region = os.getenv("AWS_REGION", "us-east-1")
-            profile = os.getenv("AWS_PROFILE")
-            session = boto3.Session(profile_name=profile) if profile else boto3.Session()
-            self._client = session.client("bedrock-runtime", region_name=region)
+            self._client = _aws_client("bedrock-runtime")
         return self._client
     
-    def _call_model(self, body: str) -> dict:
+    def _invoke(self, body: Union[bytes, str]):
+        from botocore.exceptions import ClientError
+        if self.latency_optimized:
+            try:
+                return self.client.invoke_model(modelId=self.model, body=body, performanceConfigLatency="optimized")
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ValidationException":
+                    raise
+            # ValidationException also covers bad sizes, content filters and malformed bodies, so only
+            # blame optimized latency once the same body succeeds at standard latency
+            response = self.client.invoke_model(modelId=self.model, body=body)
+            _LATENCY_REJECTED.add((self.model, self.region))
+            self.latency_optimized = False
+            return response
+        return self.client.invoke_model(modelId=self.model, body=body)
+    
+    def _call_model(self, body: Union[bytes, str]) -> dict:
         from botocore.exceptions import TokenRetrievalError, NoCredentialsError, ClientError
         try:
-            response = self.client.invoke_model(modelId=self.model, body=body)
-            return json.loads(response["body"].read())
+            response = self._invoke(body)
+            return json_loads(response["body"].read())
         except TokenRetrievalError:
             raise ValueError("AWS SSO session expired. Run 'aws sso login' to refresh.")
         except NoCredentialsError:
+            _bedrock_client.cache_clear()  # Client was built without credentials - rebuild once they're configured
             raise ValueError("AWS credentials not found. Configure AWS_PROFILE or credentials.")
         except ClientError as e:
             raise ValueError(f"AWS API error: {e.response['Error']['Message']}")
     
-    def generate(self, prompt: str, reference: PIL.Image.Image = None, width: int = 1024, height: int = 1024) -> bytes:
+    def generate(self, prompt: str, reference: Union[PIL.Image.Image, bytes] = None, width: int = 1024, height: int = 1024) -> bytes:
         if reference:
             return self.transform(reference, prompt)
         
         if "nova-canvas" in self.model:
-            body = json.dumps({
+            body = json_dumps({
                 "taskType": "TEXT_IMAGE",
                 "textToImageParams": {"text": prompt},
                 "imageGenerationConfig": {"numberOfImages": 1, "width": width, "height": height}
             })
         else:
-            body = json.dumps({"text_prompts": [{"text": prompt}], "cfg_scale": 10, "steps": 50, "width": width, "height": height})
+            body = json_dumps({"text_prompts": [{"text": prompt}], "cfg_scale": 10, "steps": 50, "width": width, "height": height})
         
         result = self._call_model(body)
         
         if "nova-canvas" in self.model:
-            return base64.b64decode(result["images"][0])
-        return base64.b64decode(result["artifacts"][0]["base64"])
+            return binascii.a2b_base64(result["images"][0])
+        return binascii.a2b_base64(result["artifacts"][0]["base64"])
     
-    def transform(self, image: PIL.Image.Image, prompt: str) -> bytes:
-        buffer = BytesIO()
-        image.save(buffer, format="PNG")
-        init_image = base64.b64encode(buffer.getvalue()).decode()
+    def transform(self, image: Union[PIL.Image.Image, bytes], prompt: str) -> bytes:
+        if isinstance(image, bytes):
+            data = image
+        else:
+            # Fast zlib level: the PNG is only a transport format and is base64'd straight from the buffer view
+            buffer = BytesIO()
+            image.save(buffer, format="PNG", optimize=False, compress_level=1)
+            data = buffer.getbuffer()
+        init_image = binascii.b2a_base64(data, newline=False).decode("ascii")
         
         if "nova-canvas" in self.model:
-            body = json.dumps({
+            body = json_dumps({
                 "taskType": "IMAGE_VARIATION",
                 "imageVariationParams": {"text": prompt, "images": [init_image]},
                 "imageGenerationConfig": {"numberOfImages": 1, "width": 1024, "height": 1024}
             })
         else:
-            body = json.dumps({"text_prompts": [{"text": prompt}], "init_image": init_image, "cfg_scale": 10, "steps": 50})
+            body = json_dumps({"text_prompts": [{"text": prompt}], "init_image": init_image, "cfg_scale": 10, "steps": 50})
         
         result = self._call_model(body)
         
         if "nova-canvas" in self.model:
-            return base64.b64decode(result["images"][0])
-        return base64.b64decode(result["artifacts"][0]["base64"])
+            return binascii.a2b_base64(result["images"][0])
+        return binascii.a2b_base64(result["artifacts"][0]["base64"])
 
 
-class OpenAIProvider:
+class OpenAIProvider(ImageProvider):
     def __init__(self, model: str):
         self.model = model
         self._client = None
@@ -155,44 +312,48 @@ class OpenAIProvider:
     @property
     def client(self):
         if self._client is None:
-            from openai import OpenAI
             api_key = os.getenv("OPENAI_API_KEY")
             if not api_key:
                 raise ValueError("OPENAI_API_KEY not set")
-            self._client = OpenAI(api_key=api_key)
+            self._client = _openai_client(api_key)
         return self._client
     
-    def generate(self, prompt: str, reference: PIL.Image.Image = None, width: int = 1024, height: int = 1024) -> bytes:
+    def generate(self, prompt: str, reference: Union[PIL.Image.Image, bytes] = None, width: int = 1024, height: int = 1024) -> bytes:
         from openai import AuthenticationError, APIError
         if reference:
             return self.transform(reference, prompt)
         try:
             response = self.client.images.generate(model=self.model, prompt=prompt, n=1, size=f"{width}x{height}")
-            return base64.b64decode(response.data[0].b64_json)
+            return binascii.a2b_base64(response.data[0].b64_json)
         except AuthenticationError:
             raise ValueError("OpenAI API key invalid or expired. Check OPENAI_API_KEY.")
         except APIError as e:
             raise ValueError(f"OpenAI API error: {e.message}")
     
-    def transform(self, image: PIL.Image.Image, prompt: str) -> bytes:
+    def transform(self, image: Union[PIL.Image.Image, bytes], prompt: str) -> bytes:
         from openai import AuthenticationError, APIError
         try:
-            buffer = BytesIO()
-            image.save(buffer, format="PNG")
-            buffer.seek(0)
+            if isinstance(image, bytes):
+                mime = _mime_type(image)
+                upload = ("image.jpg" if mime == "image/jpeg" else "image.png", image, mime)
+            else:
+                buffer = BytesIO()
+                image.save(buffer, format="PNG", optimize=False, compress_level=1)
+                buffer.seek(0)
+                upload = ("image.png", buffer, "image/png")
             response = self.client.images.edit(
                 model=self.model,
-                image=[("image.png", buffer, "image/png")],
+                image=[upload],
                 prompt=prompt
             )
-            return base64.b64decode(response.data[0].b64_json)
+            return binascii.a2b_base64(response.data[0].b64_json)
         except AuthenticationError:
             raise ValueError("OpenAI API key invalid or expired. Check OPENAI_API_KEY.")
         except APIError as e:
             raise ValueError(f"OpenAI API error: {e.message}")
 
 
-class GeminiProvider:
+class GeminiProvider(ImageProvider):
     def __init__(self, model: str):
         self.model = model
         self._client = None
@@ -200,13 +361,50 @@ class GeminiProvider:
     @property
     def client(self):
         if self._client is None:
-            from google import genai
             api_key = os.getenv("GEMINI_API_KEY")
             if not api_key:
                 raise ValueError("GEMINI_API_KEY not set")
-            self._client = genai.Client(api_key=api_key)
+            self._client = _gemini_client(api_key)
         return self._client
     
+    def _context_cache(self, prompt: str):
+        """Return a cached-content name holding this prompt, creating it on first use."""
+        if os.getenv("GEMINI_CONTEXT_CACHE", "false").lower() != "true" or len(prompt) < GEMINI_CACHE_MIN_CHARS:
+            return None
+        model_key = f"{os.getenv('GEMINI_API_KEY')}\0{self.model}"
+        if _cache_lookup(model_key) is GEMINI_CACHE_REJECTED:
+            return None
+        key = hashlib.sha256(f"{model_key}\0{prompt}".encode()).hexdigest()
+        cached = _cache_lookup(key)
+        if cached:
+            return cached
+        from google.genai import types, errors
+        try:
+            cache = self.client.caches.create(
+                model=self.model,
+                config=types.CreateCachedContentConfig(contents=[prompt], ttl=f"{GEMINI_CACHE_TTL}s")
+            )
+        except errors.ClientError as e:
+            if e.code != 429:
+                # Model doesn't support explicit caching (or prompt under its token minimum) - don't retry for a TTL
+                _GEMINI_CONTEXT_CACHES[model_key] = (GEMINI_CACHE_REJECTED, time.time() + GEMINI_CACHE_TTL)
+            return None
+        except Exception:
+            # Transient (rate limit, 5xx, network) - send uncached this time and try caching again next call
+            return None
+        # Expire locally a little early so we never reference a cache the server just dropped
+        _GEMINI_CONTEXT_CACHES[key] = (cache.name, time.time() + GEMINI_CACHE_TTL - 30)
+        return cache.name
+    
+    def _prompt_and_config(self, prompt: str, cacheable: bool = True):
+        from google.genai import types
+        config = types.GenerateContentConfig(response_modalities=['Text', 'Image'])
+        cache_name = self._context_cache(prompt) if cacheable else None
+        if cache_name:
+            config.cached_content = cache_name
+            return GEMINI_CACHED_PROMPT_FOLLOWUP, config
+        return prompt, config
+    
     def _generate_content(self, contents, config):
         try:
             return self.client.models.generate_content(model=self.model, contents=contents, config=config)
@@ -218,19 +416,24 @@ class GeminiProvider:
                 raise ValueError("Gemini API key lacks permission for this model.")
             raise ValueError(f"Gemini API error: {e}")
     
-    def generate(self, prompt: str, reference: PIL.Image.Image = None, width: int = 1024, height: int = 1024) -> bytes:
+    def generate(self, prompt: str, reference: Union[PIL.Image.Image, bytes] = None, width: int = 1024, height: int = 1024) -> bytes:
         if reference:
             return self.transform(reference, prompt)
-        from google.genai import types
-        response = self._generate_content([prompt], types.GenerateContentConfig(response_modalities=['Text', 'Image']))
+        prompt, config = self._prompt_and_config(prompt)
+        response = self._generate_content([prompt], config)
         for part in response.candidates[0].content.parts:
             if part.inline_data is not None:
                 return part.inline_data.data
         raise ValueError("No image in response")
     
-    def transform(self, image: PIL.Image.Image, prompt: str) -> bytes:
-        from google.genai import types
-        response = self._generate_content([image, prompt], types.GenerateContentConfig(response_modalities=['Text', 'Image']))
+    def transform(self, image: Union[PIL.Image.Image, bytes], prompt: str) -> bytes:
+        if isinstance(image, bytes):
+            from google.genai import types
+            image = types.Part.from_bytes(data=image, mime_type=_mime_type(image))
+        # Image first keeps a stable prefix for Gemini's implicit caching when one image gets several edits;
+        # the edit instruction must follow the image, so it never moves into an explicit context cache
+        prompt, config = self._prompt_and_config(prompt, cacheable=False)
+        response = self._generate_content([image, prompt], config)
         for part in response.candidates[0].content.parts:
             if part.inline_data is not None:
                 return part.inline_data.data
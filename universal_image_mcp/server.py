@@ -1,13 +1,28 @@
 """Universal Image MCP Server"""
 import os
-from io import BytesIO
+import re
+import asyncio
+from io import BytesIO, StringIO
 from datetime import datetime
 from typing import Optional
 import PIL.Image
 from mcp.server.fastmcp import FastMCP
+from . import image_cache
 
 FORBIDDEN_PATHS = ['/etc', '/sys', '/proc', '/dev', '/boot', '/root', '/var', '/usr', '/bin', '/sbin']
 REPO_URL = "https://github.com/manu-mishra/universal-image-mcp"
+# Checked in order: AWS prefixes first, then OpenAI and Gemini keywords anywhere in the id
+PROVIDER_PATTERN = re.compile(r'(?P<aws>amazon\.|stability\.)|(?P<openai>(?=.*(?:gpt|dall|chatgpt)))|(?P<gemini>(?=.*(?:gemini|imagen)))', re.I)
+PROVIDER_CLASSES = {'aws': ('AWS', 'AWSProvider'), 'openai': ('OpenAI', 'OpenAIProvider'), 'gemini': ('Gemini', 'GeminiProvider')}
+ENABLE_FLAGS = {name: f'ENABLE_{name.upper()}' for name in PROVIDER_CLASSES}
+EXTENSION_FORMATS = {'.png': 'PNG', '.jpg': 'JPEG', '.jpeg': 'JPEG', '.webp': 'WEBP'}
+# Encoder settings used with FAST_IMAGE_SAVE=true when output needs re-encoding
+FAST_SAVE_OPTIONS = {
+    '.png': {'compress_level': 1},
+    '.jpg': {'quality': 90, 'optimize': False, 'progressive': False},
+    '.jpeg': {'quality': 90, 'optimize': False, 'progressive': False},
+    '.webp': {'quality': 90, 'method': 0},
+}
 
 def validate_output_path(path: str) -> str:
     """Validate output path to prevent path traversal attacks."""
@@ -20,89 +35,147 @@ def validate_output_path(path: str) -> str:
     
     return abs_path
 
+def detect_format(data: bytes) -> Optional[str]:
+    """Identify PNG/JPEG/WEBP bytes from their magic number."""
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'PNG'
+    if data.startswith(b'\xff\xd8'):
+        return 'JPEG'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+def load_reference(path: str):
+    """Load a reference image: PNG/JPEG bytes go to providers as-is, anything else is decoded with PIL."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if detect_format(data) in ('PNG', 'JPEG'):
+        return data
+    # Decode fully now so the provider gets a detached image in a mode PNG encoders accept
+    with PIL.Image.open(BytesIO(data)) as image:
+        if image.mode in ('RGB', 'RGBA'):
+            return image.copy()
+        return image.convert('RGBA' if image.has_transparency_data else 'RGB')
+
+def check_complete(data: bytes, image_format: str) -> None:
+    """Cheap truncation check without decoding pixels; raises ValueError for an incomplete image."""
+    if image_format == 'PNG':
+        # Only PNG's verify() does real work: it walks every chunk and checks its CRC
+        with PIL.Image.open(BytesIO(data)) as image:
+            image.verify()
+    elif image_format == 'JPEG' and b'\xff\xd9' not in data[-64:]:
+        # Search the tail rather than the last two bytes: encoders may pad or append data after EOI
+        raise ValueError("Truncated JPEG image (missing end-of-image marker)")
+    elif image_format == 'WEBP' and int.from_bytes(data[4:8], 'little') + 8 != len(data):
+        raise ValueError("Truncated WEBP image (size does not match RIFF header)")
+
+def is_intact(data: bytes) -> bool:
+    """True when data is a recognised image format that passes check_complete."""
+    image_format = detect_format(data)
+    if image_format is None:
+        return False
+    try:
+        check_complete(data, image_format)
+    except Exception:
+        return False
+    return True
+
+def save_image(image_data: bytes, output_path: str) -> None:
+    """Save provider output, re-encoding with PIL only when the output extension needs another format."""
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    ext = os.path.splitext(output_path)[1].lower()
+    image_format = detect_format(image_data)
+    if image_format == EXTENSION_FORMATS.get(ext, ''):
+        check_complete(image_data, image_format)
+        with open(output_path, 'wb') as f:
+            f.write(image_data)
+        return
+    options = FAST_SAVE_OPTIONS.get(ext, {}) if os.getenv("FAST_IMAGE_SAVE", "false").lower() == "true" else {}
+    image = PIL.Image.open(BytesIO(image_data))
+    image.save(output_path, **options)
+
 mcp = FastMCP(
     "universal-image-mcp",
     instructions=f"""Multi-provider image generation server supporting AWS Bedrock (Nova Canvas), OpenAI/ChatGPT (GPT Image), and Google Gemini (Nano Banana, Imagen).
 
-Use list_models() to see available models, generate_image() to create images, transform_image() to edit existing images, and prompt_guide() for tips on writing effective prompts.
+Use list_models() to see available models, generate_image() to create images, generate_images() to create several images in parallel, transform_image() to edit existing images, and prompt_guide() for tips on writing effective prompts.
 
 ⭐ Star the repo: {REPO_URL}
 🐛 Report issues: {REPO_URL}/issues"""
 )
 
 def is_enabled(provider: str) -> bool:
-    return os.getenv(f"ENABLE_{provider.upper()}", "false").lower() == "true"
+    flag = ENABLE_FLAGS.get(provider) or f"ENABLE_{provider.upper()}"
+    return os.getenv(flag, "false").lower() == "true"
 
 def get_provider(model_id: str):
     """Get provider instance for the given model_id. Imports are lazy to avoid loading disabled providers."""
-    from .providers import AWSProvider, OpenAIProvider, GeminiProvider
+    match = PROVIDER_PATTERN.match(model_id)
+    if not match:
+        raise ValueError(f"Unknown model: {model_id}. Use list_models() to see available models.")
     
-    if model_id.startswith("amazon.") or model_id.startswith("stability."):
-        if not is_enabled("aws"):
-            raise ValueError("AWS provider not enabled. Set ENABLE_AWS=true")
-        return AWSProvider(model_id)
-    elif "gpt" in model_id.lower() or "dall" in model_id.lower() or "chatgpt" in model_id.lower():
-        if not is_enabled("openai"):
-            raise ValueError("OpenAI provider not enabled. Set ENABLE_OPENAI=true")
-        return OpenAIProvider(model_id)
-    elif "gemini" in model_id.lower() or "imagen" in model_id.lower():
-        if not is_enabled("gemini"):
-            raise ValueError("Gemini provider not enabled. Set ENABLE_GEMINI=true")
-        return GeminiProvider(model_id)
-    raise ValueError(f"Unknown model: {model_id}. Use list_models() to see available models.")
+    name = match.lastgroup
+    label, class_name = PROVIDER_CLASSES[name]
+    if not is_enabled(name):
+        raise ValueError(f"{label} provider not enabled. Set {ENABLE_FLAGS[name]}=true")
+    from . import providers
+    return getattr(providers, class_name)(model_id)
 
 
 @mcp.tool()
-def list_models() -> str:
+async def list_models() -> str:
     """List available image generation models from all enabled providers.
     
     Returns a formatted list of model IDs that can be used with generate_image and transform_image.
     Models are fetched dynamically from each provider's API.
     """
-    results = []
+    from . import providers
+    listers = {"aws": providers.get_aws_models, "openai": providers.get_openai_models, "gemini": providers.get_gemini_models}
+    
+    # Each lister is a blocking HTTPS round-trip, so start them all before formatting any
+    fetches = {name: asyncio.create_task(asyncio.to_thread(fn)) for name, fn in listers.items() if is_enabled(name)}
+    
+    if not fetches:
+        return "No providers enabled. Set ENABLE_AWS=true, ENABLE_OPENAI=true, or ENABLE_GEMINI=true"
+    
+    buf = StringIO()
     
-    if is_enabled("aws"):
+    if "aws" in fetches:
+        buf.write("AWS Bedrock:\n")
         try:
-            from .providers import get_aws_models
-            results.append("AWS Bedrock:")
-            for m in get_aws_models():
-                results.append(f"  {m['id']}")
-                results.append(f"    Name: {m['name']} | Provider: {m['provider']} | Status: {m['status']}")
-                results.append(f"    Input: {', '.join(m['input'])}")
+            for m in await fetches["aws"]:
+                buf.write(f"  {m['id']}\n"
+                          f"    Name: {m['name']} | Provider: {m['provider']} | Status: {m['status']}\n"
+                          f"    Input: {', '.join(m['input'])}\n")
         except Exception as e:
-            results.append(f"  Error: {e}")
+            buf.write(f"  Error: {e}\n")
     
-    if is_enabled("openai"):
+    if "openai" in fetches:
+        buf.write("OpenAI:\n")
         try:
-            from .providers import get_openai_models
-            results.append("OpenAI:")
-            for m in get_openai_models():
+            for m in await fetches["openai"]:
                 created = datetime.fromtimestamp(m['created']).strftime('%Y-%m-%d')
-                results.append(f"  {m['id']}")
-                results.append(f"    Released: {created} | Owner: {m['owned_by']}")
+                buf.write(f"  {m['id']}\n"
+                          f"    Released: {created} | Owner: {m['owned_by']}\n")
         except Exception as e:
-            results.append(f"  Error: {e}")
+            buf.write(f"  Error: {e}\n")
     
-    if is_enabled("gemini"):
+    if "gemini" in fetches:
+        buf.write("Google Gemini:\n")
         try:
-            from .providers import get_gemini_models
-            results.append("Google Gemini:")
-            for m in get_gemini_models():
-                results.append(f"  {m['id']}")
-                results.append(f"    Name: {m['name']}")
+            for m in await fetches["gemini"]:
+                buf.write(f"  {m['id']}\n"
+                          f"    Name: {m['name']}\n")
                 if m.get('description'):
-                    results.append(f"    {m['description'][:80]}...")
+                    buf.write(f"    {m['description'][:80]}...\n")
         except Exception as e:
-            results.append(f"  Error: {e}")
-    
-    if not results:
-        return "No providers enabled. Set ENABLE_AWS=true, ENABLE_OPENAI=true, or ENABLE_GEMINI=true"
+            buf.write(f"  Error: {e}\n")
     
-    return "\n".join(results)
+    return buf.getvalue().rstrip("\n")
 
 
 @mcp.tool()
-def generate_image(
+async def generate_image(
     prompt: str,
     model_id: str,
     output_path: str,
@@ -139,13 +212,31 @@ def generate_image(
             reference_image = os.path.expanduser(reference_image)
             if not os.path.exists(reference_image):
                 return f"Error: Reference image not found at {reference_image}"
-            ref_img = PIL.Image.open(reference_image)
+            ref_img = await asyncio.to_thread(load_reference, reference_image)
         
-        image_data = provider.generate(prompt, ref_img, width, height)
+        cache_dir = image_cache.cache_dir()
+        if cache_dir:
+            cache_limit = image_cache.max_bytes()
+            # Hashing a decoded reference walks its whole pixel buffer, so keep it off the event loop
+            key = await asyncio.to_thread(image_cache.cache_key, model_id, prompt, width, height, ref_img)
+            cached = await asyncio.to_thread(image_cache.load, cache_dir, key)
+            if cached is not None and not await asyncio.to_thread(is_intact, cached):
+                # Corrupt entry - drop it and regenerate; output/conversion errors below are not the cache's fault
+                await asyncio.to_thread(image_cache.discard, cache_dir, key)
+                cached = None
+            if cached is not None:
+                await asyncio.to_thread(save_image, cached, output_path)
+                return f"Image saved to {output_path} (cached)"
         
-        image = PIL.Image.open(BytesIO(image_data))
-        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
-        image.save(output_path)
+        image_data = await provider.agenerate(prompt, ref_img, width, height)
+        
+        await asyncio.to_thread(save_image, image_data, output_path)
+        
+        if cache_dir:
+            try:
+                await asyncio.to_thread(image_cache.store, cache_dir, key, image_data, cache_limit)
+            except OSError:
+                pass  # A cache write failure shouldn't fail a generation that already succeeded
         
         return f"Image saved to {output_path}"
     except Exception as e:
@@ -153,7 +244,54 @@ def generate_image(
 
 
 @mcp.tool()
-def transform_image(
+async def generate_images(
+    prompts: list[str],
+    model_id: str,
+    output_paths: list[str],
+    width: Optional[int] = 1024,
+    height: Optional[int] = 1024
+) -> str:
+    """Generate several images in parallel, one per prompt, using the specified model.
+    
+    Args:
+        prompts: List of detailed text descriptions, one per image. See generate_image for prompt tips.
+        model_id: Model identifier from list_models(). Examples: "amazon.nova-canvas-v1:0",
+                  "gpt-image-1.5", "models/gemini-2.5-flash-image"
+        output_paths: File paths where the images will be saved, in the same order as prompts.
+                      Parent directories are created automatically.
+        width: Optional. Image width in pixels for every image. Default: 1024.
+        height: Optional. Image height in pixels for every image. Default: 1024.
+    
+    Returns:
+        One line per image with its output path, or an error description for images that failed.
+    """
+    try:
+        if not prompts:
+            return "Error: prompts must not be empty"
+        if len(prompts) != len(output_paths):
+            return "Error: prompts and output_paths must have the same length"
+        output_paths = [validate_output_path(path) for path in output_paths]
+        provider = get_provider(model_id)
+        
+        images = await asyncio.to_thread(provider.generate_batch, prompts, width, height, return_exceptions=True)
+        
+        results = []
+        for output_path, image_data in zip(output_paths, images):
+            try:
+                if isinstance(image_data, Exception):
+                    raise image_data
+                await asyncio.to_thread(save_image, image_data, output_path)
+                results.append(f"Image saved to {output_path}")
+            except Exception as e:
+                results.append(f"Error ({output_path}): {e}")
+        
+        return "\n".join(results)
+    except Exception as e:
+        return f"Error: {e}"
+
+
+@mcp.tool()
+async def transform_image(
     image_path: str,
     prompt: str,
     model_id: str,
@@ -180,13 +318,11 @@ def transform_image(
         
         output_path = validate_output_path(output_path)
         
-        source = PIL.Image.open(image_path)
+        source = await asyncio.to_thread(load_reference, image_path)
         provider = get_provider(model_id)
-        image_data = provider.transform(source, prompt)
+        image_data = await provider.atransform(source, prompt)
         
-        image = PIL.Image.open(BytesIO(image_data))
-        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
-        image.save(output_path)
+        await asyncio.to_thread(save_image, image_data, output_path)
         
         return f"Image saved to {output_path}"
     except Exception as e: